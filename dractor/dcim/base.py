@@ -230,7 +230,7 @@ class DCIMMethodObject(DCIM):
             # unless we know about the object (CIM_References for now)
             if isinstance(prop_value, CIM_Reference):
                 properties.append((prop_name, prop_value))
-            elif isinstance(prop_value, list):
+            elif isinstance(prop_value, (list, tuple)):
                 for item in prop_value:
                     properties.append((prop_name, str(item)))
             else:
@@ -28,6 +28,14 @@ from dractor.recipe.base import ConfiguredRecipe
 from dractor.exceptions import (DCIMCommandError, RecipeConfigurationError,
                                 RecipeExecutionError, LCDataError)
 
+LOGGER = logging.getLogger(__name__)
+
+# Compiled once since these are matched against every drive in a configuration
+_VIRTUAL_DISK_RE = re.compile(r'Disk\.Virtual\.[0-9]+$')
+_PHYSICAL_DISK_RE = re.compile(r'Disk\.Bay\.[0-9]+$')
+_DRIVE_FQDD_RE = re.compile(r'Disk\.Bay\.[0-9]+:Enclosure.\w+\.[0-9]-[0-9]:'
+                            r'(RAID\.\w+\.[0-9]-[0-9])$')
+
 class RAIDRecipe(ConfiguredRecipe):
     """
     Recipe for configuring RAID
@@ -320,9 +328,9 @@ class RAIDRecipe(ConfiguredRecipe):
                     key = enclosure
                 elif key == "Controller":
                     key = controller
-                elif re.match(r'Disk\.Virtual\.[0-9]+$', key):
+                elif _VIRTUAL_DISK_RE.match(key):
                     key = '{}:{}'.format(key, controller)
-                elif re.match(r'Disk\.Bay\.[0-9]+$', key):
+                elif _PHYSICAL_DISK_RE.match(key):
                     key = '{}:{}'.format(key, enclosure)
 
                 return key
@@ -653,14 +661,13 @@ class RAIDConfiguration(object): # pylint: disable=too-many-instance-attributes
     def __init__(self, name, configuration, physical_drive_fqdds):
         """ Break down the configuration into an intermediate form """
 
-        self._logger = logging.getLogger(__name__)
-
         self.name = name
-        self._physical_drive_fqdds = set(physical_drive_fqdds)
+        self._physical_drive_fqdds = frozenset(physical_drive_fqdds)
         self._controllers = None
         self._raid_fqdds = []
         self._jbod_fqdds = []
         self._global_spare_fqdds = []
+        self._all_drives = None
         self._virtual_disks = {}
         self._explicit_jbod = False # Are any drives explicitly set to JBOD
 
@@ -682,9 +689,14 @@ class RAIDConfiguration(object): # pylint: disable=too-many-instance-attributes
                 # Add the virtual disk members to the list of RAID PDs
                 self._raid_fqdds.extend(self._virtual_disks[key].drive_fqdds)
             else:
-                self._logger.warning("Configuration '%s': Unknown key in "
-                                     "settings: %s", name, key)
+                LOGGER.warning("Configuration '%s': Unknown key in "
+                               "settings: %s", name, key)
 
+        # The drive collections are only used for set operations from here on
+        self._raid_fqdds = frozenset(self._raid_fqdds)
+        self._jbod_fqdds = frozenset(self._jbod_fqdds)
+        self._global_spare_fqdds = frozenset(self._global_spare_fqdds)
+        self._all_drives = self._raid_fqdds | self._jbod_fqdds | self._global_spare_fqdds
 
         # Perform sanity checks
         self._sanity_raid()
@@ -700,34 +712,34 @@ class RAIDConfiguration(object): # pylint: disable=too-many-instance-attributes
     def _sanity_raid(self):
         """ Sanity check RAID vs NON-RAID.  There should be no intersection """
 
-        disk_intersection = set(self._raid_fqdds).intersection(set(self._jbod_fqdds))
+        disk_intersection = self._raid_fqdds & self._jbod_fqdds
         if disk_intersection:
             message = ("Configuration '{}': Drives are configured for "
                        "both raid and non-raid: {}").format(self.name,
                                                             disk_intersection)
 
-            self._logger.error(message)
+            LOGGER.error(message)
             raise RecipeConfigurationError(message)
 
     def _sanity_spares(self):
         """ Sanity check hot spares """
 
-        disk_intersection = set(self._raid_fqdds).intersection(set(self._global_spare_fqdds))
+        disk_intersection = self._raid_fqdds & self._global_spare_fqdds
         if disk_intersection:
             message = ("Configuration '{}': Drives are configured for "
                        "both RAID and hot spare: {}"
                       ).format(self.name, disk_intersection)
 
-            self._logger.error(message)
+            LOGGER.error(message)
             raise RecipeConfigurationError(message)
 
-        disk_intersection = set(self._jbod_fqdds).intersection(set(self._global_spare_fqdds))
+        disk_intersection = self._jbod_fqdds & self._global_spare_fqdds
         if disk_intersection:
             message = ("Configuration '{}': Drives are configured for "
                        "both Non-RAID and hot spare: {}"
                       ).format(self.name, disk_intersection)
 
-            self._logger.error(message)
+            LOGGER.error(message)
             raise RecipeConfigurationError(message)
 
     def _santiy_present(self):
@@ -736,12 +748,12 @@ class RAIDConfiguration(object): # pylint: disable=too-many-instance-attributes
         catch this, but if a profile is forced, we should cry loudly)
         """
 
-        disks_not_present = self.all_drives - self._physical_drive_fqdds
+        disks_not_present = self._all_drives - self._physical_drive_fqdds
 
         if disks_not_present:
             message = ("Configuration '{}': Drives not present on physical "
                        "host: {}").format(self.name, disks_not_present)
-            self._logger.error(message)
+            LOGGER.error(message)
             raise RecipeConfigurationError(message)
 
     def _implied_drives(self):
@@ -749,53 +761,53 @@ class RAIDConfiguration(object): # pylint: disable=too-many-instance-attributes
         Default PDs that are not mentioned to Non-RAID
         """
 
-        implied_disks = self._physical_drive_fqdds - self.all_drives
+        implied_disks = self._physical_drive_fqdds - self._all_drives
 
         for disk in implied_disks:
-            self._logger.info("Disk %s not mentioned in configuration.  Setting"
-                              " to JBOD/single RAID0 mode.", disk)
+            LOGGER.info("Disk %s not mentioned in configuration.  Setting"
+                        " to JBOD/single RAID0 mode.", disk)
 
-            self._jbod_fqdds.append(disk)
+        self._jbod_fqdds |= implied_disks
+        self._all_drives |= implied_disks
 
     def _controller_set_from_drives(self):
         """ Take a list of controllers and return a set of controllers """
 
         controllers = set()
-        for drive in self.all_drives:
-            match = re.match(r'Disk\.Bay\.[0-9]+:Enclosure.\w+\.[0-9]-[0-9]:'
-                             r'(RAID\.\w+\.[0-9]-[0-9])$', drive)
+        for drive in self._all_drives:
+            match = _DRIVE_FQDD_RE.match(drive)
             if match:
                 controllers.add(match.group(1))
             else:
                 message = "Malformed drive: {}".format(drive)
-                self._logger.error(message)
+                LOGGER.error(message)
                 raise RecipeConfigurationError(message)
 
-        self._controllers = controllers
+        self._controllers = frozenset(controllers)
 
     @property
     def all_drives(self):
         """ Return all the drives we are configuring """
 
-        return set(self._raid_fqdds + self._jbod_fqdds + self._global_spare_fqdds)
+        return self._all_drives
 
     @property
     def raid_drive_fqdds(self):
         """ Return an array of FQDDs of drives that are members of virtual disks """
 
-        return set(self._raid_fqdds)
+        return self._raid_fqdds
 
     @property
     def jbod_drive_fqdds(self):
         """ Returns an array of FQDDs of drives that should be in JBOD mode """
 
-        return set(self._jbod_fqdds)
+        return self._jbod_fqdds
 
     @property
     def global_spare_drive_fqdds(self):
         """ Returns an array of FQDDs of drives that should be global spares """
 
-        return set(self._global_spare_fqdds)
+        return self._global_spare_fqdds
 
     @property
     def virtual_disks(self):
@@ -813,11 +825,14 @@ class RAIDConfiguration(object): # pylint: disable=too-many-instance-attributes
     def controllers(self):
         """ Return a list of controllers we are targeting """
 
-        return set(self._controllers)
+        return self._controllers
 
 class VirtualDisk(object):
     """ Object to represent a virtual disk """
 
+    __slots__ = ('_config_name', '_virtual_disk', '_target', '_drive_fqdds',
+                 '_vdict', '_names', '_values')
+
     RAID0 = 2
     RAID1 = 4
     RAID5 = 64
@@ -826,35 +841,47 @@ class VirtualDisk(object):
     RAID50 = 8192
     RAID60 = 16384
 
+    _MODES = {
+        'RAID0': RAID0,
+        'RAID1': RAID1,
+        'RAID5': RAID5,
+        'RAID6': RAID6,
+        'RAID10': RAID10,
+        'RAID50': RAID50,
+        'RAID60': RAID60,
+    }
+    """ Mapping of configuration Mode strings to DRAC RAIDLevel values """
+
     def __init__(self, config_name, virtual_disk, vdict):
 
         self._config_name = config_name
         self._virtual_disk = virtual_disk
+        self._target = virtual_disk.split(':', 1)[1]
 
         # We need to make sure to not pass PhysicalDiskIDs to the DRAC
         self._drive_fqdds = vdict.pop('PhysicalDiskIDs')
         self._vdict = vdict
-        self._logger = logging.getLogger(__name__)
 
         mode_string = vdict.pop('Mode')
-        if not hasattr(self, mode_string):
+        try:
+            self._vdict['RAIDLevel'] = self._MODES[mode_string]
+        except KeyError:
             message = ("Configuration {}: Unknown RAID level "
                        "{}").format(config_name, mode_string)
-            self._logger.error(message)
+            LOGGER.error(message)
             raise RecipeConfigurationError(message)
 
-        self._vdict['RAIDLevel'] = getattr(self, mode_string)
-
-        names, values = dict_to_prop_array(vdict)
+        # The configuration arrays are read-only from here on out
+        names, values = zip(*vdict.items()) if vdict else ((), ())
 
-        self._names = names
-        self._values = values
+        self._names = tuple(names)
+        self._values = tuple(values)
 
     @property
     def target(self):
         """ Return the controller FQDD for this virtual disk """
 
-        return self.virtual_disk.split(':')[1]
+        return self._target
 
     @property
     def drive_fqdds(self):
@@ -910,11 +937,21 @@ def replace_keys(my_dict, transform_key):
     return my_dict
 
 def flatten_enumeration(my_enumeration):
-    """ Flatten a dictionary of DCIMAttributeObjects """
+    """ Flatten a dictionary of DCIMAttributeObjects.  This walks the
+    attribute dictionaries in place rather than building a copy of the
+    whole enumeration for flatten_dict. """
 
-    pure_dictionary = {k: v.dictionary for k, v in my_enumeration.items()}
+    flattened_list = []
+
+    for key, instance in my_enumeration.items():
+        for attribute, element in instance.dictionary.items():
+            if isinstance(element, dict):
+                for tup in flatten_dict(element):
+                    flattened_list.append((key, attribute) + tup)
+            else:
+                flattened_list.append((key, attribute, element))
 
-    return flatten_dict(pure_dictionary)
+    return flattened_list
 
 
 def flatten_dict(my_dict):
@@ -932,15 +969,3 @@ def flatten_dict(my_dict):
             flattened_list.append((key, element))
 
     return flattened_list
-
-def dict_to_prop_array(my_dict):
-    """ Take a dictionary and return a MOF prop array """
-
-    names = []
-    values = []
-
-    for key, value in my_dict.items():
-        names.append(key)
-        values.append(value)
-
-    return names, values
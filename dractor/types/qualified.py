@@ -20,16 +20,54 @@
 Our standard return type
 """
 
+_NO_DESCRIPTION = ("No description provided",)
+""" Default description for values without one in the MOF """
+
+_SUFFIX_CACHE = {}
+""" Unit suffixes keyed by (units, punit) qualifier pairs """
+
+def _format_suffix(units, punit):
+    """ Format the human readable unit suffix for a units/punit pair """
+
+    if units:
+        return " {}".format(units)
+    elif punit:
+        return " {}".format(punit)
+
+    return ""
+
+def _unit_suffix(units, punit):
+    """ Return the (cached) unit suffix for a units/punit pair """
+
+    key = (units, punit)
+
+    try:
+        suffix = _SUFFIX_CACHE.get(key)
+    except TypeError:
+        # Qualifiers like PUnit("...") are parsed as lists
+        return _format_suffix(units, punit)
+
+    if suffix is None:
+        suffix = _format_suffix(units, punit)
+        _SUFFIX_CACHE[key] = suffix
+
+    return suffix
+
+
 class DCIMQualifiedValue(object):
     """
     Simple object to incorporate metadata from the MOF files
     """
 
+    __slots__ = ('_qualifiers', '_valuemap', '_value', '_mapped', '_mapped_value',
+                 '_description')
+
     def __init__(self, value, valuemap, qualifiers):
 
         self._qualifiers = qualifiers
         self._valuemap = valuemap
         self._value = value
+        self._description = None
 
         # See if there is a mapping for this value
         if value in valuemap:
@@ -40,13 +78,10 @@ class DCIMQualifiedValue(object):
             self._mapped = False
 
         # Map units for human readability
-        units = qualifiers.get("units")
-        punit = qualifiers.get("punit")
-
-        if units:
-            self._mapped_value = "{} {}".format(self._mapped_value, units)
-        elif punit:
-            self._mapped_value = "{} {}".format(self._mapped_value, punit)
+        if qualifiers:
+            suffix = _unit_suffix(qualifiers.get("units"), qualifiers.get("punit"))
+            if suffix:
+                self._mapped_value = "{}{}".format(self._mapped_value, suffix)
 
     @property
     def qualifiers(self):
@@ -70,9 +105,10 @@ class DCIMQualifiedValue(object):
     def description(self):
         """ Return the description for this value if any """
 
-        description = self._qualifiers.get("description", ["No description provided"])
+        if self._description is None:
+            self._description = "\n".join(self._qualifiers.get("description", _NO_DESCRIPTION))
 
-        return "\n".join(description)
+        return self._description
 
     @property
     def unmapped_value(self):
@@ -25,12 +25,15 @@ class CIM_Reference(object):
     Base class for endpoint references
     """
 
+    __slots__ = ('_value', '_selector_set')
+
     ResourceURI = None
     """ Resource URI to be filled in by children """
 
     def __init__(self, value):
 
         self._value = value
+        self._selector_set = None
 
     @property
     def resource_uri(self):
@@ -46,7 +49,10 @@ class CIM_Reference(object):
         Return the selector set dictionary
         """
 
-        return {"InstanceID": self._value}
+        if self._selector_set is None:
+            self._selector_set = {"InstanceID": self._value}
+
+        return self._selector_set
 
 
 class CIM_SoftwareIdentity(CIM_Reference):
@@ -54,4 +60,6 @@ class CIM_SoftwareIdentity(CIM_Reference):
     CIM_SoftwareIdentity for the DCIM_SoftwareInstallationService
     """
 
+    __slots__ = ()
+
     ResourceURI = 'http://schemas.dell.com/wbem/wscim/1/cimschema/2/DCIM_SoftwareIdentity'
@@ -24,14 +24,19 @@ import logging
 import json
 import sys
 
-# Our module
-from dractor.dcim import Client
-from dractor.recipe import HealthRecipe, ChassisRecipe, RAIDRecipe, BIOSRecipe
-from dractor.exceptions import RecipeException, WSMANConnectionError
+# Our module.  The client and recipes are imported inside the commands that
+# use them so that --help and single commands don't pay to import everything.
+from dractor.exceptions import (RecipeException, WSMANConnectionError, WSMANClientException,
+                                DCIMClientException)
 
 # Third Party
 import click
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 LOGGER = logging.getLogger(__name__)
 
 #
@@ -43,9 +48,12 @@ LOGGER = logging.getLogger(__name__)
 @click.option('--port', default=443, help='HTTPS port for DRAC')
 @click.option('--quiet', is_flag=True, help='Set console logging to WARNING or higher')
 @click.option('--verbose', is_flag=True, help='Set console logging to DEBUG')
+@click.option('--sort-keys/--no-sort-keys', default=True,
+              help='Sort keys in JSON output (default).  Unsorted output is faster, but its '
+                   'order is not stable on Pythons without ordered dicts')
 @click.argument('hostname')
 @click.pass_context
-def cli(ctx, hostname, username, password, port, quiet, verbose): # pylint: disable=too-many-arguments
+def cli(ctx, hostname, username, password, port, quiet, verbose, sort_keys): # pylint: disable=too-many-arguments
     """ Main entry point for application """
 
     #
@@ -64,17 +72,39 @@ def cli(ctx, hostname, username, password, port, quiet, verbose): # pylint: disa
         # Make requests quiet unless we are debugging
         logging.getLogger("requests").setLevel(logging.WARNING)
 
+    from dractor.dcim import Client
+
     try:
         client = Client(hostname, port, username, password)
         client.connect()
     except WSMANConnectionError:
         print("\nFailed to connect to iDRAC")
         sys.exit(1)
-    except Exception as exc:
-        print("\nGeneral problem creating client")
+    except (WSMANClientException, DCIMClientException) as exc:
+        LOGGER.debug("Client creation failed", exc_info=True)
+        print("\nGeneral problem creating client: {}".format(exc))
         sys.exit(1)
 
     ctx.obj['client'] = client
+    ctx.obj['sort_keys'] = sort_keys
+
+#
+# Output helpers
+#
+def print_json(ctx, data):
+    """ Dump data as JSON, sorting keys unless --no-sort-keys was given.  Uses
+    orjson when it is installed since inventories can be large. """
+
+    sort_keys = ctx.obj['sort_keys']
+
+    if orjson:
+        option = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        print(orjson.dumps(data, option=option).decode('utf-8'))
+    else:
+        # orjson only supports two space indents, so match it
+        print(json.dumps(data, indent=2, sort_keys=sort_keys))
 
 #
 # Recipe Commands
@@ -95,6 +125,8 @@ def raid():
 def configure_raid(ctx, profile, configuration):
     """ Use the RAID recipe to configure RAID """
 
+    from dractor.recipe import RAIDRecipe
+
     raid_recipe = RAIDRecipe(ctx.obj['client'])
     raid_recipe.configure_raid(configuration, profile=profile)
 
@@ -106,9 +138,11 @@ def configure_raid(ctx, profile, configuration):
 def show_raid_configuration(ctx, profile, configuration):
     """ Get the matching RAID profile or fail """
 
+    from dractor.recipe import RAIDRecipe
+
     raid_recipe = RAIDRecipe(ctx.obj['client'])
     config_data = raid_recipe.get_selected_configuration(configuration, profile=profile)
-    print(json.dumps(config_data, indent=4, sort_keys=True))
+    print_json(ctx, config_data)
 
 
 @raid.command(name='inventory', help="Show how host RAID is currently configured")
@@ -116,10 +150,12 @@ def show_raid_configuration(ctx, profile, configuration):
 def get_raid_inventory(ctx):
     """ Ask the LC about the RAID properties necessary for creating configurations """
 
+    from dractor.recipe import RAIDRecipe
+
     raid_recipe = RAIDRecipe(ctx.obj['client'])
     inventory = raid_recipe.get_inventory()
 
-    print(json.dumps(inventory, indent=4, sort_keys=True))
+    print_json(ctx, inventory)
 
 #
 # BIOS Group
@@ -135,10 +171,12 @@ def bios():
 def get_bios_inventory(ctx):
     """ Get list of BIOS settings """
 
+    from dractor.recipe import BIOSRecipe
+
     bios_recipe = BIOSRecipe(ctx.obj['client'])
     settings = bios_recipe.inventory()
 
-    print(json.dumps(settings, indent=4, sort_keys=True))
+    print_json(ctx, settings)
 
 
 @bios.command(name='profile', help="Show how host is currently configured")
@@ -148,9 +186,11 @@ def get_bios_inventory(ctx):
 def show_bios_configuration(ctx, profile, configuration):
     """ Show matching BIOS configuration """
 
+    from dractor.recipe import BIOSRecipe
+
     bios_recipe = BIOSRecipe(ctx.obj['client'])
     config_data = bios_recipe.get_selected_configuration(configuration, profile=profile)
-    print(json.dumps(config_data, indent=4, sort_keys=True))
+    print_json(ctx, config_data)
 
 
 @bios.command(name='apply', help="Show how host is currently configured")
@@ -159,6 +199,8 @@ def show_bios_configuration(ctx, profile, configuration):
 def configure_bios(ctx, configuration):
     """ Configure system BIOS """
 
+    from dractor.recipe import BIOSRecipe
+
     bios_recipe = BIOSRecipe(ctx.obj['client'])
     bios_recipe.configure_bios(configuration)
 
@@ -178,6 +220,8 @@ def health():
 def health_status(ctx):
     """ Call set_health_attributes """
 
+    from dractor.recipe import HealthRecipe
+
     health_recipe = HealthRecipe(ctx.obj['client'])
     status = health_recipe.check_health_status()
 
@@ -192,6 +236,8 @@ def chassis():
 def blink_uid(ctx):
     """ Turn on the Identify LED """
 
+    from dractor.recipe import ChassisRecipe
+
     chassis_recipe = ChassisRecipe(ctx.obj['client'])
     chassis_recipe.uid_led_on()
 
@@ -200,6 +246,8 @@ def blink_uid(ctx):
 def unblink_uid(ctx):
     """ Turn off the Identify LED """
 
+    from dractor.recipe import ChassisRecipe
+
     chassis_recipe = ChassisRecipe(ctx.obj['client'])
     chassis_recipe.uid_led_off()
 
@@ -208,6 +256,8 @@ def unblink_uid(ctx):
 def power_on(ctx):
     """ Turn on the system """
 
+    from dractor.recipe import ChassisRecipe
+
     chassis_recipe = ChassisRecipe(ctx.obj['client'])
     chassis_recipe.power_on()
 
@@ -216,6 +266,8 @@ def power_on(ctx):
 def power_off(ctx):
     """ Turn off the system """
 
+    from dractor.recipe import ChassisRecipe
+
     chassis_recipe = ChassisRecipe(ctx.obj['client'])
     chassis_recipe.power_off()
 
@@ -224,6 +276,8 @@ def power_off(ctx):
 def power_cycle(ctx):
     """ Power cycle the system """
 
+    from dractor.recipe import ChassisRecipe
+
     chassis_recipe = ChassisRecipe(ctx.obj['client'])
     chassis_recipe.power_cycle()
 
@@ -232,6 +286,8 @@ def power_cycle(ctx):
 def status(ctx):
     """ Power cycle the system """
 
+    from dractor.recipe import ChassisRecipe
+
     chassis_recipe = ChassisRecipe(ctx.obj['client'])
     chassis_recipe.status()
 
@@ -20,14 +20,22 @@
 Client class for maintaining a connection to a DRAC
 """
 
+import base64
+import collections
 import logging
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Third Party
 import requests
 import requests.adapters
+import requests.auth
 import requests.exceptions
 import requests.packages.urllib3
+from requests.packages.urllib3.connection import HTTPConnection
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
+from requests.packages.urllib3.util.retry import Retry
 
 # This project
 
@@ -40,6 +48,8 @@ from dractor.exceptions import (
 )
 
 from ._envelopes import (
+    MESSAGE_ID_PLACEHOLDER,
+    new_message_id,
     IdentifyEnvelope,
     EnumerateEnvelope,
     GetEnvelope,
@@ -69,6 +79,9 @@ class HTTPConfig(object):
         retries that should be made for 'failed' HTTP requests.  In this
         context, an HTTP request is considered to be a 'failed' one,
         if the HTTP status code was not in the success range (e.g. 200s).
+        Only connection failures and the busy statuses in
+        ``CustomHTTPAdapter.RETRY_STATUSES`` are retried, with exponential
+        backoff between attempts.
     """
 
     DEFAULT_CONNECTION_TIMEOUT = 12.1
@@ -123,6 +136,24 @@ class HTTPConfig(object):
         return self.connection_timeout, self.read_timeout
 
 
+def _keepalive_socket_options():
+    """
+    Socket options for DRAC connections.  On top of urllib3's defaults
+    (TCP_NODELAY) we turn on TCP keepalive, so that idle pooled connections
+    are not silently dropped by NAT/firewall timeouts between calls.
+    """
+
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+
+    # Keepalive tuning is platform specific (these exist on Linux)
+    for name, value in (('TCP_KEEPIDLE', 30), ('TCP_KEEPINTVL', 15), ('TCP_KEEPCNT', 4)):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+
+    return options
+
+
 class CustomHTTPAdapter(requests.adapters.HTTPAdapter):
     """
     Custom extensions to requests' HTTPAdapter
@@ -131,38 +162,93 @@ class CustomHTTPAdapter(requests.adapters.HTTPAdapter):
     to request.send(...) every time.
     """
 
-    def __init__(self, http_config):
+    DEFAULT_POOL_CONNECTIONS = 4
+    """Default number of connection pools to cache"""
+
+    DEFAULT_POOL_MAXSIZE = 16
+    """Default maximum number of connections to keep in a pool"""
+
+    SOCKET_OPTIONS = _keepalive_socket_options()
+    """Socket options applied to every pooled connection"""
+
+    RETRY_STATUSES = frozenset([502, 503, 504])
+    """HTTP statuses the DRAC returns while busy, which are worth retrying.  500
+    is left out since that is also how WSMAN reports a SOAP fault"""
+
+    RETRY_BACKOFF_FACTOR = 0.5
+    """Exponential backoff between retries (0.5s, 1s, 2s, ...)"""
+
+    def __init__(self, http_config, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE):
         assert isinstance(http_config, HTTPConfig), "not an instance of HTTPConfig"
         self.http_config = http_config
-        super(CustomHTTPAdapter, self).__init__(max_retries=http_config.max_retries)
+        super(CustomHTTPAdapter, self).__init__(pool_connections=pool_connections,
+                                                pool_maxsize=pool_maxsize,
+                                                pool_block=False,
+                                                max_retries=self._retry_policy(http_config.max_retries))
         self._logger = logging.getLogger(__name__)
 
         if not http_config.verify_ssl_cert:
             requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
+    @classmethod
+    def _retry_policy(cls, max_retries):
+        """Build the urllib3 retry policy for our POSTs
+
+        Connection failures and busy statuses are retried with backoff.
+        urllib3 1.19 and later also honor any Retry-After header by default.
+        Read errors are not retried, since the DRAC may already have acted on
+        the request.  Once retries run out the last response is returned so
+        the caller can check its status as usual.
+        """
+        kwargs = {
+            'total': max_retries,
+            'read': 0,
+            'backoff_factor': cls.RETRY_BACKOFF_FACTOR,
+            'status_forcelist': cls.RETRY_STATUSES,
+            'raise_on_status': False,
+        }
+        try:
+            return Retry(allowed_methods=frozenset(['POST']), **kwargs)
+        except TypeError:   # urllib3 < 1.26 calls it method_whitelist
+            return Retry(method_whitelist=frozenset(['POST']), **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        """Override to apply our socket options to pooled connections"""
+        pool_kwargs.setdefault('socket_options', self.SOCKET_OPTIONS)
+        super(CustomHTTPAdapter, self).init_poolmanager(connections, maxsize, block=block,
+                                                        **pool_kwargs)
+
     # pylint: disable=R0913
     def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
         """Override and inject a default set of timeouts if timeout=None"""
         if timeout is None:
             timeout = self.http_config.timeouts
-        self._logger.debug("Sending request %s", {
-            'method': request.method,
-            'body': request.body,
-            'headers': request.headers,
-            'url': request.url,
-        })
+
+        # Only build the diagnostic dictionaries when they will be logged
+        debug = self._logger.isEnabledFor(logging.DEBUG)
+
+        if debug:
+            self._logger.debug("Sending request %s", {
+                'method': request.method,
+                'body': request.body,
+                'headers': request.headers,
+                'url': request.url,
+            })
         response = super(CustomHTTPAdapter, self).send(
             request, stream=stream, timeout=timeout, verify=verify, proxies=proxies)
-        self._logger.debug("Got response %s", {
-            'encoding': response.encoding,
-            'headers': response.headers,
-            'content': response.content,
-            'reason': response.reason,
-            'status_code': response.status_code,
-            'url': response.url,
-            'is_permanent_redirect': response.is_permanent_redirect,
-            'is_redirect': response.is_redirect
-        })
+        if debug:
+            # Don't touch response.content here, it would read a streamed body
+            self._logger.debug("Got response %s", {
+                'encoding': response.encoding,
+                'headers': response.headers,
+                'content-length': response.headers.get('Content-Length'),
+                'reason': response.reason,
+                'status_code': response.status_code,
+                'url': response.url,
+                'is_permanent_redirect': response.is_permanent_redirect,
+                'is_redirect': response.is_redirect
+            })
         return response
 
 
@@ -202,12 +288,46 @@ class WSMANBasicAuthConfig(WSMANAuthConfig):
         self.password = password
 
 
+class PreEncodedBasicAuth(requests.auth.AuthBase):
+    """HTTP Basic Auth with the Authorization header encoded once up front
+
+    ``requests.auth.HTTPBasicAuth`` base64 encodes the credentials on every
+    request. Staying an ``AuthBase`` (rather than a session default header)
+    keeps requests from consulting ~/.netrc per request and lets it re-apply
+    the header after a redirect.
+    """
+
+    def __init__(self, username, password):
+        credentials = "{}:{}".format(username, password).encode('latin1')
+        self._header = "Basic {}".format(base64.b64encode(credentials).decode('ascii'))
+
+    def __call__(self, request):
+        request.headers['Authorization'] = self._header
+        return request
+
+
 class WSMANClient(object):
     """
     Low level WSMAN client for DRAC
     """
 
-    def __init__(self, host, port=443, auth_config=None, http_config=None):
+    INVOKE_SELECTOR_KEYS = frozenset(['CreationClassName', 'SystemCreationClassName',
+                                      'SystemName', 'Name', 'InstanceID'])
+    """ Properties of a class instance that address it for an Invoke """
+
+    ENVELOPE_CACHE_SIZE = 64
+    """ Most serialized envelopes kept per client.  Gets keyed by job ID or FQDD
+    would otherwise grow the cache for as long as the client lives """
+
+    def __init__(self, host, port=443, auth_config=None, http_config=None,
+                 invoke_selectors=None):
+        """
+        Arguments:
+            invoke_selectors (dict, optional): Invoke selectors keyed by DCIM class.
+                Pass the same dict to several clients to share discovered
+                selectors between them.  Entries are only ever assigned whole,
+                so sharing it between threads needs no lock.
+        """
         self._logger = logging.getLogger(__name__)
 
         # check init parameters
@@ -226,67 +346,88 @@ class WSMANClient(object):
         else:
             self._url = "https://{}:{}/wsman".format(host, port)
 
-        self._auth = requests.auth.HTTPBasicAuth(auth_config.username, auth_config.password)
+        self._auth = PreEncodedBasicAuth(auth_config.username, auth_config.password)
         self._http_adapter = CustomHTTPAdapter(http_config)
         self._verify = http_config.verify_ssl_cert
-        self._invoke_selectors = {}
+        if invoke_selectors is None:
+            invoke_selectors = {}
+        self._invoke_selectors = invoke_selectors
+
+        # Serialized Get/Enumerate envelopes, which only differ by MessageID
+        # between calls for the same class and selectors.  Least recently
+        # used entries are dropped past ENVELOPE_CACHE_SIZE
+        self._envelope_cache = collections.OrderedDict()
+        self._envelope_cache_lock = threading.Lock()
+
+        # One long lived session so consecutive calls to the same DRAC reuse
+        # the underlying connection (keep-alive) instead of handshaking again
+        self._session = requests.Session()
+        self._session.mount("https://", self._http_adapter)
+        self._session.auth = self._auth
+        self._session.verify = self._verify
+
+        # DRACs sit on the management LAN; don't let proxy or CA bundle
+        # environment variables override our own HTTP settings
+        self._session.trust_env = False
+
+        # Enumerations are verbose XML and compress well; urllib3 inflates
+        # the reply transparently before we see response.content
+        self._session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def close(self):
+        """ Close the HTTP session and any pooled connections """
+
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def _do_post(self, payload):
         """
         Post the payload to the WSMAN endpoint.  Handle
         """
         self._logger.debug("Begin doing HTTP POST with SOAP message")
-
-        # Prepare the http request
-        with requests.Session() as session:
-            self._logger.debug("Begin preparing POST request with payload:\n%s", payload)
-            try:
-                session.mount("https", self._http_adapter)
-                request = requests.Request('POST', self._url, auth=self._auth, data=str(payload))
-                prepared_request = request.prepare()
-            except requests.exceptions.RequestException:
-                error_message = "Error preparing HTTP request"
-                self._logger.exception(error_message)
-                raise WSMANConnectionError(error_message)
-            else:
-                self._logger.debug("Finished preparing POST request")
-
-            # Submit the http request
-            self._logger.debug("Begin submitting POST request")
-            try:
-                response = session.send(prepared_request, verify=self._verify)
-            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
-                error_message = "HTTP connection error"
-                self._logger.exception(error_message)
-                raise WSMANConnectionError(error_message)
-            except requests.exceptions.RequestException:
-                error_message = "Error preparing HTTP request"
-                self._logger.exception(error_message)
-                raise WSMANTransportError(error_message)
-            else:
-                self._logger.debug("Finished submitting POST request")
-
-            # now check response for errors
-            self._logger.debug("Begin checking POST response")
-            try:
-                response.raise_for_status()
-            except requests.exceptions.HTTPError:
-                error_message = (
-                    "DRAC WSMAN endpoint returned HTTP code '{}' Reason '{}'"
-                    ).format(response.status_code, response.reason)
-                self._logger.exception(error_message)
-                if response.status_code == 401:
-                    raise WSMANAuthError(error_message)
-                else:
-                    raise WSMANHTTPError(error_message)
+        self._logger.debug("POST payload:\n%s", payload)
+
+        # Submit the http request
+        self._logger.debug("Begin submitting POST request")
+        try:
+            response = self._session.post(self._url, data=payload, verify=self._verify)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            error_message = "HTTP connection error"
+            self._logger.exception(error_message)
+            raise WSMANConnectionError(error_message)
+        except requests.exceptions.RequestException:
+            error_message = "Error preparing HTTP request"
+            self._logger.exception(error_message)
+            raise WSMANTransportError(error_message)
+        else:
+            self._logger.debug("Finished submitting POST request")
+
+        # now check response for errors
+        self._logger.debug("Begin checking POST response")
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            error_message = (
+                "DRAC WSMAN endpoint returned HTTP code '{}' Reason '{}'"
+                ).format(response.status_code, response.reason)
+            self._logger.exception(error_message)
+            if response.status_code == 401:
+                raise WSMANAuthError(error_message)
             else:
-                self._logger.debug("Received non-error HTTP response")
-            finally:
-                self._logger.debug("Finished checking POST response")
+                raise WSMANHTTPError(error_message)
+        else:
+            self._logger.debug("Received non-error HTTP response")
+        finally:
+            self._logger.debug("Finished checking POST response")
 
-            # make sure its a string
-            reply = response.content # Avoid unicode difficulties
-            self._logger.debug("Received SOAP reply:\n%s", reply)
+        # make sure its a string
+        reply = response.content # Avoid unicode difficulties
+        self._logger.debug("Received %s byte SOAP reply", len(reply))
 
         # return it
         return reply
@@ -300,13 +441,33 @@ class WSMANClient(object):
 
         return IdentifyResponse(xml_response).dictionary
 
+    def _cached_document(self, key, envelope_factory):
+        """ Return a document from the envelope cache with a fresh MessageID,
+        building and caching it with envelope_factory() on a miss """
+
+        with self._envelope_cache_lock:
+            template = self._envelope_cache.get(key)
+            if template is not None:
+                self._envelope_cache.move_to_end(key)
+
+        if template is None:
+            template = envelope_factory().document_template
+
+            with self._envelope_cache_lock:
+                self._envelope_cache[key] = template
+                if len(self._envelope_cache) > self.ENVELOPE_CACHE_SIZE:
+                    self._envelope_cache.popitem(last=False)
+
+        return template.replace(MESSAGE_ID_PLACEHOLDER, new_message_id().encode('ascii'), 1)
+
     def get(self, dcim_class, selectors):
         """ classname is the DCIM class name
         """
 
-        envelope = GetEnvelope(self._url, dcim_class, selectors)
+        key = ('get', dcim_class, tuple(sorted(selectors.items())))
+        document = self._cached_document(key, lambda: GetEnvelope(self._url, dcim_class, selectors))
 
-        xml_response = self._do_post(envelope.document)
+        xml_response = self._do_post(document)
 
         return GetResponse(xml_response, dcim_class).dictionary
 
@@ -317,14 +478,44 @@ class WSMANClient(object):
 
         items = self._pull_context(dcim_class, context)
 
+        # Remember how to address this class so a later invoke doesn't
+        # have to enumerate it again
+        if items and dcim_class not in self._invoke_selectors:
+            self._store_invoke_selectors(dcim_class, items[0])
+
         return items
 
+    def enumerate_many(self, dcim_classes, max_workers=8):
+        """ Enumerate several classes concurrently
+
+        Each enumeration is a serial Enumerate/Pull exchange, so running them
+        side by side hides the round trip latency of the individual requests.
+
+        Arguments:
+            dcim_classes (iterable): DCIM class names to enumerate
+            max_workers (int): Maximum number of concurrent enumerations.  This
+                should not exceed the HTTP adapter's pool size.
+
+        Returns:
+            dict: The enumerated items keyed by DCIM class name
+        """
+
+        dcim_classes = list(dcim_classes)
+        if not dcim_classes:
+            return {}
+
+        workers = min(max_workers, len(dcim_classes))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(self.enumerate, dcim_classes)
+
+            return dict(zip(dcim_classes, results))
 
     def _get_context(self, dcim_class):
         """ Get the enumeration context """
 
-        envelope = EnumerateEnvelope(self._url, dcim_class)
-        xml_response = self._do_post(envelope.document)
+        key = ('enumerate', dcim_class)
+        document = self._cached_document(key, lambda: EnumerateEnvelope(self._url, dcim_class))
+        xml_response = self._do_post(document)
         context = EnumerateResponse(xml_response).context
 
         return context
@@ -351,28 +542,37 @@ class WSMANClient(object):
         """ Get the necessary selectors for a class """
 
         # Check if we have done this already
-        if not dcim_class in self._invoke_selectors:
-            self._discover_invoke_selector(dcim_class)
+        selectors = self._invoke_selectors.get(dcim_class)
+        if selectors is None:
+            selectors = self._discover_invoke_selector(dcim_class)
 
-        return self._invoke_selectors[dcim_class]
+        return selectors
 
     def _discover_invoke_selector(self, dcim_class):
         """ Selector Discovery """
 
-        selectors = {'__cimnamespace': 'root/dcim'}
-        required = ['CreationClassName', 'SystemCreationClassName',
-                    'SystemName', 'Name', 'InstanceID']
-
-        endpoint = self.enumerate(dcim_class)
+        # enumerate() records the selectors of the first item it finds
+        self.enumerate(dcim_class)
 
         # No items/endpoint should be caught by enmuerate
 
-        for key, value in endpoint[0].items():
-            if key in required:
+        return self._invoke_selectors[dcim_class]
+
+    def _store_invoke_selectors(self, dcim_class, item):
+        """ Cache the invoke selectors taken from an enumerated item """
+
+        selectors = {'__cimnamespace': 'root/dcim'}
+
+        for key, value in item.items():
+            if key in self.INVOKE_SELECTOR_KEYS:
                 selectors[key] = value
 
+        # Discovery may race between threads or clients sharing the cache, but it
+        # always yields the same answer and a single dict assignment is atomic
         self._invoke_selectors[dcim_class] = selectors
 
+        return selectors
+
     def invoke(self, dcim_class, method, properties):
         """ Do an invoke """
 
@@ -18,7 +18,8 @@
 
 import copy
 import logging
-import uuid
+import os
+from xml.sax.saxutils import escape, quoteattr
 
 # Third Party
 from lxml import etree
@@ -26,10 +27,43 @@ from lxml import etree
 # Module
 from dractor.exceptions import WSMANSOAPEnvelopeError
 from dractor.types import CIM_Reference
-from ._namespace import NS
+from ._namespace import (NS, S_BODY, S_HEADER, WSA_ACTION, WSA_MESSAGE_ID, WSA_TO,
+                         WSMAN_RESOURCE_URI)
 
 LOGGER = logging.getLogger(__name__)
 
+_DCIM_BASE = NS['dcim'] + '/'
+""" Prefix of every DCIM resource URI """
+
+MESSAGE_ID_PLACEHOLDER = b"uuid:__MESSAGE_ID__"
+""" Stands in for the MessageID in cached documents (see WSMANSOAPEnvelope.document_template) """
+
+def new_message_id():
+    """ Return a fresh MessageID, a random (version 4) UUID.  We format random
+    bytes directly since building uuid.UUID objects is wasted work for a string. """
+
+    raw = bytearray(os.urandom(16))
+    raw[6] = raw[6] & 0x0f | 0x40     # RFC 4122 version 4
+    raw[8] = raw[8] & 0x3f | 0x80     # RFC 4122 variant
+    hexid = raw.hex()
+    return "uuid:{}-{}-{}-{}-{}".format(hexid[:8], hexid[8:12], hexid[12:16],
+                                        hexid[16:20], hexid[20:])
+
+_TEXT_ENTITIES = {"\r": "&#13;"}
+""" Beyond &, < and >.  A literal CR would be normalized to LF when the fragment is parsed """
+
+def _escape_text(value):
+    """ Escape value for use as element text in a template.  None gives an
+    empty element, like assigning None to .text does """
+
+    if value is None:
+        return ""
+
+    return escape(value, _TEXT_ENTITIES)
+
+# Templates are indented for readability, but that whitespace shouldn't end up on the wire
+_TEMPLATE_PARSER = etree.XMLParser(remove_blank_text=True)
+
 class IdentifyEnvelope(object):
     """
     This is a little bit of an odd one.  It is not derived from our WSMANSoapEnvelope.  I don't know
@@ -47,21 +81,22 @@ class IdentifyEnvelope(object):
     <s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope" xmlns:wsmid="http://schemas.dmtf.org/wbem/wsman/identity/1/wsmanidentity.xsd">
     <s:Header></s:Header>
     <s:Body>
-    <wsmid:Identify>
-    </wsmid:Identify>
+    <wsmid:Identify></wsmid:Identify>
     </s:Body>
     </s:Envelope>
     """
 
     @property
     def document(self):
-        """ Return xml document as string for consumption """
+        """ Return xml document as UTF-8 bytes for consumption """
 
-        # Back and forth to make sure our Template is valid XML
-        root = etree.fromstring(self.ENVELOPE_TEMPLATE)
-        xml = etree.tostring(root, pretty_print=True, encoding='unicode')
+        return _IDENTIFY_DOCUMENT
 
-        return xml
+# The Identify payload never changes, so only go back and forth through lxml
+# once (to make sure our Template is valid XML)
+_IDENTIFY_DOCUMENT = etree.tostring(etree.fromstring(IdentifyEnvelope.ENVELOPE_TEMPLATE,
+                                                     parser=_TEMPLATE_PARSER),
+                                    encoding='utf-8', xml_declaration=True)
 
 class WSMANSOAPEnvelope(object):
     """
@@ -69,7 +104,7 @@ class WSMANSOAPEnvelope(object):
     Addressing and WSMAN namespaces that are fundamental to the basic
     wsman calls.
 
-    I use XPath to update the required addressing tags rather than adding them
+    I look up and update the required addressing tags rather than adding them
     dynamically.  I do this to make the basic required structure more clear, as
     far as xml can be clear, in the template itself.
     """
@@ -87,81 +122,93 @@ class WSMANSOAPEnvelope(object):
                     <wsa:Address>http://schemas.xmlsoap.org/ws/2004/08/addressing/role/anonymous</wsa:Address>
                 </wsa:ReplyTo>
              </s:Header>
-             <s:Body>
-            </s:Body>
+             <s:Body></s:Body>
        </s:Envelope>
     """
 
-    def __init__(self, to_url, action_ns_prefix, action, resource_uri, additional_namespaces=None):
+    _TEMPLATE_ROOT = etree.fromstring(ENVELOPE_TEMPLATE, parser=_TEMPLATE_PARSER)
+    """ Parsed template.  Copying this is cheaper than parsing the template again """
 
-        self._nsmap = copy.deepcopy(NS)
+    SELECTOR_SET_TEMPLATE = '<wsman:SelectorSet xmlns:wsman="{wsman}">{selectors}</wsman:SelectorSet>'
+    SELECTOR_TEMPLATE = '<wsman:Selector wsman:Name={name}>{value}</wsman:Selector>'
 
+    def __init__(self, to_url, action_ns_prefix, action, resource_uri, additional_namespaces=None):
+
+        # NS only holds strings, so share it read-only unless we need to extend it
         if additional_namespaces:
-            self._nsmap.update(additional_namespaces)
+            self._nsmap = dict(NS, **additional_namespaces)
+        else:
+            self._nsmap = NS
 
         # NS shortcuts
         self._action_ns_prefix = action_ns_prefix
         self._resource_uri = resource_uri
 
         # Use a WSMAN SOAP Template to save on the boiler plate
-        self._root = etree.fromstring(self.ENVELOPE_TEMPLATE)
+        self._root = copy.deepcopy(self._TEMPLATE_ROOT)
+
+        # The template structure is fixed, so grab the header and body elements
+        # we fill in once rather than searching for them each time
+        self._header_elem = self._root.find(S_HEADER)
+        self._body_elem = self._root.find(S_BODY)
+        self._to_elem = self._header_elem.find(WSA_TO)
+        self._action_elem = self._header_elem.find(WSA_ACTION)
+        self._resource_uri_elem = self._header_elem.find(WSMAN_RESOURCE_URI)
+        self._message_id_elem = self._header_elem.find(WSA_MESSAGE_ID)
 
         # Update the To
-        self._set_text("/s:Envelope/s:Header/wsa:To", to_url)
+        self._to_elem.text = to_url
 
         # Set the action
-        action_uri = "{}/{}".format(self._nsmap[action_ns_prefix], action)
-        self._set_text("/s:Envelope/s:Header/wsa:Action", action_uri)
+        self._action_elem.text = self._nsmap[action_ns_prefix] + '/' + action
 
         # Set the Resource URI
-        self._set_text("/s:Envelope/s:Header/wsman:ResourceURI", resource_uri)
+        self._resource_uri_elem.text = resource_uri
 
     def _set_message_id(self):
         """ Set a UUID for each message """
 
-        message_id = self._get_one_xpath("/s:Envelope/s:Header/wsa:MessageID")
-        message_id.text = "uuid:{}".format(str(uuid.uuid4()))
+        self._message_id_elem.text = new_message_id()
 
     @property
     def document(self):
-        """ Return as string for consumption """
+        """ Return as UTF-8 bytes for consumption.  This is what goes on
+        the wire, so there is no pretty printing. """
 
         self._set_message_id()  # Make sure to generate a fresh UUID
 
-        xml = etree.tostring(self._root, pretty_print=True, encoding='unicode')
+        xml = etree.tostring(self._root, encoding='utf-8', xml_declaration=True)
 
         return xml
 
-    def _get_one_xpath(self, path):
-        """ Make sure our path exists and returns one element """
-
-        # Xpath returns an array of matches
-        element = self._root.xpath(path, namespaces=self._nsmap)
+    @property
+    def document_template(self):
+        """ Return the document with MESSAGE_ID_PLACEHOLDER as the MessageID.
+        This can be cached and stamped with new_message_id() for each send. """
 
-        if not element:
-            raise WSMANSOAPEnvelopeError("Xpath '{}' did not return element".format(path))
+        self._message_id_elem.text = MESSAGE_ID_PLACEHOLDER.decode('ascii')
 
-        if len(element) != 1:
-            raise WSMANSOAPEnvelopeError("Xpath '{}' returned multiple elements".format(path))
+        return etree.tostring(self._root, encoding='utf-8', xml_declaration=True)
 
-        return element.pop()
+    @staticmethod
+    def _append_fragment(parent, fragment):
+        """ Parse an XML fragment and append it to parent.  Building the
+        fragment as a string and parsing it in one go is cheaper than
+        creating each element through lxml individually. """
 
-    def _set_text(self, path, text):
-        """ Set the text of the single element returned by path """
+        element = etree.fromstring(fragment)
+        parent.append(element)
 
-        element = self._get_one_xpath(path)
-        element.text = text
+        return element
 
     def _add_wsman_selectors(self, selectors):
         """ Add the selectors """
 
-        header = self._get_one_xpath("/s:Envelope/s:Header")
-        selectorset = etree.SubElement(header, "{{{wsman}}}SelectorSet".format(**self._nsmap))
+        selectors_xml = "".join(self.SELECTOR_TEMPLATE.format(name=quoteattr(key), value=_escape_text(value))
+                                for key, value in selectors.items())
 
-        for key, value in selectors.items():
-            selector = etree.SubElement(selectorset, "{{{wsman}}}Selector".format(**self._nsmap))
-            selector.set("{{{wsman}}}Name".format(**self._nsmap), key)
-            selector.text = value
+        self._append_fragment(self._header_elem,
+                              self.SELECTOR_SET_TEMPLATE.format(selectors=selectors_xml, **NS))
 
 
 class GetEnvelope(WSMANSOAPEnvelope):
@@ -173,7 +220,7 @@ class GetEnvelope(WSMANSOAPEnvelope):
     def __init__(self, to_uri, dcim_class, selectors):
         """ Setup an Enumeration for resource, such as DCIM_NICView """
 
-        resource_uri = "{}/{}".format(NS['dcim'], dcim_class)
+        resource_uri = _DCIM_BASE + dcim_class
 
         super(GetEnvelope, self).__init__(to_uri,
                                           self.ACTION_NS_PREFIX,
@@ -194,7 +241,7 @@ class EnumerationEnvelopes(WSMANSOAPEnvelope):
     def __init__(self, to_uri, dcim_class):
         """ Setup an Enumeration for dcim_class, such as DCIM_NICView """
 
-        resource_uri = "{}/{}".format(NS['dcim'], dcim_class)
+        resource_uri = _DCIM_BASE + dcim_class
 
         super(EnumerationEnvelopes, self).__init__(to_uri,
                                                    self.ACTION_NS_PREFIX,
@@ -206,16 +253,25 @@ class EnumerateEnvelope(EnumerationEnvelopes):
 
     ACTION = "Enumerate"
 
+    BODY_TEMPLATE = '<wsen:Enumerate xmlns:wsen="{wsen}"/>'
+
     def _setup_body(self):
         """ Add the Enumeration element to the body """
 
-        body = self._get_one_xpath("/s:Envelope/s:Body")
-        etree.SubElement(body, "{{{wsen}}}Enumerate".format(**self._nsmap))
+        self._append_fragment(self._body_elem, self.BODY_TEMPLATE.format(**NS))
 
 class PullEnvelope(EnumerationEnvelopes):
 
     ACTION = "Pull"
 
+    BODY_TEMPLATE = ('<wsen:Pull xmlns:wsen="{wsen}" xmlns:wsman="{wsman}">'
+                     '<wsen:EnumerationContext>{context}</wsen:EnumerationContext>'
+                     '{optimize}'
+                     '</wsen:Pull>')
+
+    OPTIMIZE_TEMPLATE = ('<wsman:OptimizeEnumeration/>'
+                         '<wsman:MaxElements>{max_elements}</wsman:MaxElements>')
+
     def __init__(self, to_uri, dcim_class, context, max_elements=50):
 
         self._context = context
@@ -225,25 +281,35 @@ class PullEnvelope(EnumerationEnvelopes):
 
     def _setup_body(self):
 
-        body = self._get_one_xpath("/s:Envelope/s:Body")
-        pull = etree.SubElement(body, "{{{wsen}}}Pull".format(**self._nsmap))
-
-        context_xml = etree.SubElement(pull, "{{{wsen}}}EnumerationContext".format(**self._nsmap))
-        context_xml.text = self._context
-
         if self._max_elements > 1:
-            etree.SubElement(pull, "{{{wsman}}}OptimizeEnumeration".format(**self._nsmap))
-            max_elements = etree.SubElement(pull, "{{{wsman}}}MaxElements".format(**self._nsmap))
-            max_elements.text = str(self._max_elements)
+            optimize = self.OPTIMIZE_TEMPLATE.format(max_elements=self._max_elements)
+        else:
+            optimize = ""
+
+        body_xml = self.BODY_TEMPLATE.format(context=_escape_text(self._context), optimize=optimize, **NS)
+        self._append_fragment(self._body_elem, body_xml)
 
 
 class InvokeEnvelope(WSMANSOAPEnvelope):
 
+    INPUT_TEMPLATE = ('<dcim_class:{method}_INPUT xmlns:dcim_class="{resource_uri}" '
+                      'xmlns:wsa="{wsa}" xmlns:wsman="{wsman}">'
+                      '{properties}'
+                      '</dcim_class:{method}_INPUT>')
+
+    PROPERTY_TEMPLATE = '<dcim_class:{name}>{value}</dcim_class:{name}>'
+
+    REFERENCE_TEMPLATE = ('<wsa:Address>http://schemas.xmlsoap.org/ws/2004/08/addressing/role/anonymous</wsa:Address>'
+                          '<wsa:ReferenceParameters>'
+                          '<wsman:ResourceURI>{resource_uri}</wsman:ResourceURI>'
+                          '<wsman:SelectorSet>{selectors}</wsman:SelectorSet>'
+                          '</wsa:ReferenceParameters>')
+
+    REFERENCE_SELECTOR_TEMPLATE = '<wsman:Selector Name={name}>{value}</wsman:Selector>'
 
     def __init__(self, to_uri, dcim_class, method, selectors, properties):
 
-        resource_uri = "{}/{}".format(NS['dcim'], dcim_class)
-        action = "{}/{}".format(resource_uri, method)
+        resource_uri = _DCIM_BASE + dcim_class
 
         additional_namespaces = {'dcim_class': resource_uri}
         super(InvokeEnvelope, self).__init__(to_uri, 'dcim_class', method, resource_uri,
@@ -254,35 +320,27 @@ class InvokeEnvelope(WSMANSOAPEnvelope):
 
     def _add_wsman_properties(self, method, properties):
 
-        body = self._get_one_xpath("/s:Envelope/s:Body")
-        element_name = "{{{}}}{}_INPUT".format(self._resource_uri, method)
-
-        input_element = etree.SubElement(body, element_name)
+        properties_xml = []
 
         for key, value in properties:
-            prop_name = "{{{}}}{}".format(self._resource_uri, key)
-            prop_element = etree.SubElement(input_element, prop_name)
 
             if isinstance(value, str):
-                prop_element.text = value
+                prop_value = _escape_text(value)
             elif isinstance(value, CIM_Reference):
                 # Construct a cim_reference
-                address = etree.SubElement(prop_element,
-                                           "{{{wsa}}}Address".format(**self._nsmap))
-                address.text = "http://schemas.xmlsoap.org/ws/2004/08/addressing/role/anonymous"
-                ref_params = etree.SubElement(prop_element,
-                                               "{{{wsa}}}ReferenceParameters".format(**self._nsmap))
-                resource_uri = etree.SubElement(ref_params,
-                                                "{{{wsman}}}ResourceURI".format(**self._nsmap))
-                resource_uri.text = value.resource_uri
-                selector_set = etree.SubElement(ref_params,
-                                                "{{{wsman}}}SelectorSet".format(**self._nsmap))
-
-                for name, value in value.selector_set.items():
-                    selector = etree.SubElement(selector_set,
-                                                "{{{wsman}}}Selector".format(**self._nsmap))
-                    selector.set("Name", name)
-                    selector.text = value
+                selectors_xml = "".join(
+                    self.REFERENCE_SELECTOR_TEMPLATE.format(name=quoteattr(name), value=_escape_text(selector))
+                    for name, selector in value.selector_set.items())
+                prop_value = self.REFERENCE_TEMPLATE.format(resource_uri=_escape_text(value.resource_uri),
+                                                            selectors=selectors_xml)
             else:
                 message = ("Unkown value type for {}: {} ({})").format(key, type(value), value)
                 raise WSMANSOAPEnvelopeError(message)
+
+            properties_xml.append(self.PROPERTY_TEMPLATE.format(name=key, value=prop_value))
+
+        input_xml = self.INPUT_TEMPLATE.format(method=method,
+                                               resource_uri=self._resource_uri,
+                                               properties="".join(properties_xml),
+                                               **NS)
+        self._append_fragment(self._body_elem, input_xml)
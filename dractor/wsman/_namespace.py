@@ -29,3 +29,22 @@ NS = {
     'wsen': "http://schemas.xmlsoap.org/ws/2004/09/enumeration", # Standard
     'dcim': "http://schemas.dell.com/wbem/wscim/1/cim-schema/2", # Not Standard
 }
+
+CLARK = {prefix: "{{{}}}".format(uri) for prefix, uri in NS.items()}
+""" Clark notation ('{uri}') prefixes for building qualified tag names """
+
+# Tags used when walking the fixed parts of SOAP envelopes
+S_HEADER = CLARK['s'] + 'Header'
+S_BODY = CLARK['s'] + 'Body'
+S_FAULT = CLARK['s'] + 'Fault'
+WSA_ACTION = CLARK['wsa'] + 'Action'
+WSA_MESSAGE_ID = CLARK['wsa'] + 'MessageID'
+WSA_TO = CLARK['wsa'] + 'To'
+WSA_ENDPOINT_REFERENCE = CLARK['wsa'] + 'EndpointReference'
+WSMAN_RESOURCE_URI = CLARK['wsman'] + 'ResourceURI'
+WSMID_IDENTIFY_RESPONSE = CLARK['wsmid'] + 'IdentifyResponse'
+WSEN_ENUMERATE_RESPONSE = CLARK['wsen'] + 'EnumerateResponse'
+WSEN_ENUMERATION_CONTEXT = CLARK['wsen'] + 'EnumerationContext'
+WSEN_PULL_RESPONSE = CLARK['wsen'] + 'PullResponse'
+WSEN_ITEMS = CLARK['wsen'] + 'Items'
+WSEN_END_OF_SEQUENCE = CLARK['wsen'] + 'EndOfSequence'
@@ -16,13 +16,97 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-import copy
+import collections
+import functools
 import logging
+import threading
 
 from lxml import etree
 
-from dractor.exceptions import WSMANFault, WSMANElementNotFound
-from ._namespace import NS
+from dractor.exceptions import WSMANFault, WSMANElementNotFound, WSMANSOAPResponseError
+from ._namespace import (
+    NS,
+    S_BODY,
+    S_FAULT,
+    WSA_ENDPOINT_REFERENCE,
+    WSEN_END_OF_SEQUENCE,
+    WSEN_ENUMERATE_RESPONSE,
+    WSEN_ENUMERATION_CONTEXT,
+    WSEN_ITEMS,
+    WSEN_PULL_RESPONSE,
+    WSMID_IDENTIFY_RESPONSE,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+DELLIDENT_NS = "http://schemas.dell.com/wbem/wscim/1/cim-schema/2/wsmanidentity.xsd"
+""" Dell's namespace for the vendor fields of an Identify response """
+
+_DELLIDENT_ANY = "{{{}}}*".format(DELLIDENT_NS)
+""" Matches any child in the dellident namespace """
+
+_PARSER_OPTIONS = dict(ns_clean=True, recover=True, encoding='utf-8',
+                       remove_blank_text=True, remove_comments=True, remove_pis=True,
+                       resolve_entities=False, huge_tree=False, collect_ids=False,
+                       no_network=True)
+""" SOAP replies need none of libxml2's whitespace, comment, ID or entity
+handling, and skipping it also gives a smaller tree """
+
+_THREAD_STATE = threading.local()
+
+
+def _parser():
+    """ This thread's XMLParser.  lxml serializes threads that share a parser,
+    and WSMANClient.enumerate_many parses from several threads at once """
+
+    parser = getattr(_THREAD_STATE, 'parser', None)
+    if parser is None:
+        parser = _THREAD_STATE.parser = etree.XMLParser(**_PARSER_OPTIONS)
+
+    return parser
+
+# Responses arrive by the hundreds, so compile the XPath expressions we
+# evaluate on every one of them once, rather than per call.  Fixed paths
+# that don't need XPath are walked with find() instead
+
+_CODE_XP = etree.XPath("s:Code/s:Value", namespaces=NS)
+_SUBCODE_XP = etree.XPath("s:Code/s:Subcode/s:Value", namespaces=NS)
+_REASON_XP = etree.XPath("s:Reason/s:Text", namespaces=NS)
+
+_JID_XP = etree.XPath("wsa:EndpointReference/wsa:ReferenceParameters/wsman:SelectorSet"
+                      "/wsman:Selector[@Name='InstanceID']", namespaces=NS)
+
+
+@functools.lru_cache(maxsize=512)
+def _class_tags(dcim_class):
+    """ Clark notation tags for an instance of dcim_class and for any of its properties """
+
+    class_ns = "{{{}/{}}}".format(NS['dcim'], dcim_class)
+    return class_ns + dcim_class, class_ns + '*'
+
+
+@functools.lru_cache(maxsize=512)
+def _invoke_output_tag(dcim_class, method):
+    """ Clark notation tag of the element holding an Invoke's output parameters """
+
+    return "{{{}/{}}}{}_OUTPUT".format(NS['dcim'], dcim_class, method)
+
+
+def _localname(tag):
+    """ The local part of a Clark notation tag.  Cheaper than building an etree.QName """
+
+    return tag.rpartition('}')[2]
+
+
+def _find_child(element, *tags):
+    """ Walk down a fixed chain of child tags, returning None if any is missing """
+
+    for tag in tags:
+        if element is None:
+            break
+        element = element.find(tag)
+
+    return element
 
 
 class WSMANResponse(object):
@@ -30,18 +114,36 @@ class WSMANResponse(object):
     Take XML SOAP responses and parse out the useful bits
     """
 
+    DOCUMENT_PREFIX_LENGTH = 4096
+    """ Bytes of the raw reply kept for diagnostics """
+
+
+    def __init__(self, document):
+        """
+        Arguments:
+            document (bytes): The SOAP response
+        """
+        self._values = collections.defaultdict(list)    # Every value seen, by key
+        self._dict = None
+
+        # Parse bytes, so libxml2 reads UTF-8 directly rather than transcoding
+        if isinstance(document, str):
+            document = document.encode('utf-8')
+
+        # recover=True gives us None rather than an exception for most garbage
+        try:
+            self._root = etree.fromstring(document, parser=_parser())
+        except etree.XMLSyntaxError as error:
+            raise WSMANSOAPResponseError("Unparseable SOAP envelope: {}".format(error))
 
-    def __init__(self, document, additional_namespaces=None):
-        self._logger = logging.getLogger(__name__)
+        if self._root is None:
+            raise WSMANSOAPResponseError("Empty or unparseable SOAP envelope")
 
-        self._nsmap = copy.deepcopy(NS)
-        if additional_namespaces:
-            self._nsmap.update(additional_namespaces)
-        self._dict = {}
+        self._body = self._root.find(S_BODY)
 
-        self._document = document
-        parser = etree.XMLParser(ns_clean=True, recover=True, encoding='utf-8')
-        self._root = etree.fromstring(self._document, parser=parser)
+        # The tree is all we need from here on, keep just enough of the raw
+        # reply to make sense of a failure in the logs
+        self._document_prefix = document[:self.DOCUMENT_PREFIX_LENGTH]
 
         self._check_fault()
         self._parse()
@@ -56,13 +158,12 @@ class WSMANResponse(object):
     def _check_fault(self):
         """ Check for any WSMAN faults """
 
-        fault = self._root.xpath("/s:Envelope/s:Body/s:Fault", namespaces=self._nsmap)
+        fault = _find_child(self._body, S_FAULT)
 
-        if fault:
-            fault = fault.pop()
-            code = fault.xpath("//s:Code/s:Value", namespaces=self._nsmap)
-            subcode = fault.xpath("//s:Code/s:Subcode/s:Value", namespaces=self._nsmap)
-            reason = fault.xpath("//s:Reason/s:Text", namespaces=self._nsmap)
+        if fault is not None:
+            code = _CODE_XP(fault)
+            subcode = _SUBCODE_XP(fault)
+            reason = _REASON_XP(fault)
 
             results = {}
 
@@ -82,16 +183,22 @@ class WSMANResponse(object):
 
     @property
     def dictionary(self):
+        """ Parsed values by key.  Keys that appeared more than once map to a list """
+
+        if self._dict is None:
+            self._dict = {key: values[0] if len(values) == 1 else values
+                          for key, values in self._values.items()}
+
         return self._dict
 
     def get(self, key, default=None):
         """ Check for item """
 
-        return self._dict.get(key, default=default)
+        return self.dictionary.get(key, default)
 
     def __getitem__(self, key):
 
-        return self._dict[key]
+        return self.dictionary[key]
 
     def __str__(self):
 
@@ -102,17 +209,10 @@ class WSMANResponse(object):
     def _elements_to_dict(self, results):
         """ Take simple elements and turn to dictionary """
 
+        # Collect everything as lists, arrays are unwrapped in .dictionary
+        values = self._values
         for element in results:
-            tag = etree.QName(element.tag)
-
-            if tag.localname in self._dict: # handle arrays!
-                if not isinstance(self._dict[tag.localname], list):
-                    values = [self._dict[tag.localname]] # Grab the original
-                    self._dict[tag.localname] = values
-
-                self._dict[tag.localname].append(element.text)
-            else:
-                self._dict[tag.localname] = element.text
+            values[_localname(element.tag)].append(element.text)
 
 
 class IdentifyResponse(WSMANResponse):
@@ -120,18 +220,13 @@ class IdentifyResponse(WSMANResponse):
     Take an Identify response and make it useful
     """
 
-    def __init__(self, document):
-        additional_namespaces = {
-            "dellident": "http://schemas.dell.com/wbem/wscim/1/cim-schema/2/wsmanidentity.xsd"
-        }
-        super(IdentifyResponse, self).__init__(document, additional_namespaces)
-
     def _parse(self):
         """ Parse the Response """
 
-        results = self._root.xpath("/s:Envelope/s:Body/wsmid:IdentifyResponse/dellident:*", namespaces=self._nsmap)
+        identify = _find_child(self._body, WSMID_IDENTIFY_RESPONSE)
 
-        self._elements_to_dict(results)
+        if identify is not None:
+            self._elements_to_dict(identify.iterchildren(_DELLIDENT_ANY))
 
 
 class WSMANClassResponse(WSMANResponse):
@@ -141,12 +236,9 @@ class WSMANClassResponse(WSMANResponse):
 
     def __init__(self, document, dcim_class):
 
-        # Class specific namespaces
         self._dcim_class = dcim_class
-        class_ns = "{}/{}".format(NS['dcim'], self._dcim_class)
-        additional_namespaces = {'dcim_class': class_ns}
 
-        super(WSMANClassResponse, self).__init__(document, additional_namespaces)
+        super(WSMANClassResponse, self).__init__(document)
 
 class GetResponse(WSMANClassResponse):
     """
@@ -155,9 +247,20 @@ class GetResponse(WSMANClassResponse):
 
     def _parse(self):
 
-        path = "/s:Envelope/s:Body/dcim_class:{}/dcim_class:*".format(self._dcim_class)
-        results = self._root.xpath(path, namespaces=self._nsmap)
-        self._elements_to_dict(results)
+        instance_tag, property_tag = _class_tags(self._dcim_class)
+        instance = _find_child(self._body, instance_tag)
+
+        if instance is None:
+            return
+
+        properties = instance.findall(property_tag)
+        values = {_localname(element.tag): element.text for element in properties}
+
+        # Keys only collide for array properties, which need collecting into lists
+        if len(values) == len(properties):
+            self._dict = values
+        else:
+            self._elements_to_dict(properties)
 
 
 class EnumerateResponse(WSMANResponse):
@@ -172,14 +275,12 @@ class EnumerateResponse(WSMANResponse):
 
     def _parse(self):
 
-        path = "/s:Envelope/s:Body/wsen:EnumerateResponse/wsen:EnumerationContext"
-
-        context = self._root.xpath(path, namespaces=self._nsmap)
+        context = _find_child(self._body, WSEN_ENUMERATE_RESPONSE, WSEN_ENUMERATION_CONTEXT)
 
-        if not context:
+        if context is None:
             raise WSMANElementNotFound("Failed to find EnumerationContext in Enumerate response")
 
-        self._context = context[0].text
+        self._context = context.text
 
 
 class PullResponse(WSMANClassResponse):
@@ -199,32 +300,54 @@ class PullResponse(WSMANClassResponse):
 
     @property
     def items(self):
+        """ One dictionary per instance, built on first use """
+
+        if self._items is None:
+            self._items = []
+
+            for item in self._item_elements:
+                self._items.append({_localname(element.tag): element.text for element in item})
+
         return self._items
 
-    def _parse(self):
+    @property
+    def columns(self):
+        """ The instances as one list of values per property, built on first use.
+        Cheaper than .items when only a few properties are needed.  Properties
+        an instance lacks are None in its position. """
 
-        # Is this the last pull request
-        end_of_sequence = self._root.xpath("/s:Envelope/s:Body/wsen:PullResponse/wsen:EndOfSequence",
-                                           namespaces=self._nsmap)
+        if self._columns is None:
+            self._columns = {}
+            count = len(self._item_elements)
 
-        self._end_of_sequence = bool(end_of_sequence)
+            for index, item in enumerate(self._item_elements):
+                for element in item:
+                    key = _localname(element.tag)
+                    column = self._columns.get(key)
+                    if column is None:
+                        column = self._columns[key] = [None] * count
+                    column[index] = element.text
 
-        path = "/s:Envelope/s:Body/wsen:PullResponse/wsen:Items/dcim_class:{}".format(self._dcim_class)
-        items = self._root.xpath(path, namespaces=self._nsmap)
+        return self._columns
 
-        if not items:
-            self._logger.debug("XPath '%s' with map '%s' found no items for doc:\n%s", path, self._nsmap, self._document)
+    def _parse(self):
+
+        pull = _find_child(self._body, WSEN_PULL_RESPONSE)
 
-        self._items = []
+        # Is this the last pull request
+        self._end_of_sequence = _find_child(pull, WSEN_END_OF_SEQUENCE) is not None
 
-        for item in items:
+        instance_tag, _ = _class_tags(self._dcim_class)
+        items_element = _find_child(pull, WSEN_ITEMS)
+        items = [] if items_element is None else items_element.findall(instance_tag)
 
-            item_dict = {}
-            for element in item.getchildren():
-                tag = etree.QName(element.tag)
-                item_dict[tag.localname] = element.text
+        if not items:
+            LOGGER.debug("Found no %s items for doc:\n%s", instance_tag, self._document_prefix)
 
-            self._items.append(item_dict)
+        # Rows and columns are only built for whichever view is asked for
+        self._item_elements = items
+        self._items = None
+        self._columns = None
 
 
 class InvokeResponse(WSMANClassResponse):
@@ -241,19 +364,21 @@ class InvokeResponse(WSMANClassResponse):
 
     def _parse(self):
 
-        path = "/s:Envelope/s:Body/dcim_class:{}_OUTPUT/dcim_class:*".format(self._method)
-        items = self._root.xpath(path, namespaces=self._nsmap)
+        output_tag = _invoke_output_tag(self._dcim_class, self._method)
+        _, property_tag = _class_tags(self._dcim_class)
+        output = _find_child(self._body, output_tag)
+        items = [] if output is None else output.findall(property_tag)
 
         # Filter any jobs first by translating them
-        self._parse_jobid()
+        self._parse_jobid(items)
 
         if not items:
-            self._logger.error("XPath '%s' with map '%s' failed for doc:\n%s", path, self._nsmap, self._document)
+            LOGGER.error("Found no %s element for doc:\n%s", output_tag, self._document_prefix)
             raise WSMANElementNotFound("No elements found in pull response")
 
         self._elements_to_dict(items)
 
-    def _parse_jobid(self):
+    def _parse_jobid(self, items):
         """ Look for a job id in the body
         <n1:Job>
         <wsa:EndpointReference>
@@ -269,12 +394,8 @@ class InvokeResponse(WSMANClassResponse):
         <n1>
         """
 
-
-
-        jobs_path = "//dcim_class:{}_OUTPUT/dcim_class:*[./wsa:EndpointReference]".format(self._method)
-        jid_path = ".//wsman:Selector[@Name='InstanceID']"
-
-        jobs = self._root.xpath(jobs_path, namespaces=self._nsmap)
+        # One pass over the output parameters we already have
+        jobs = [item for item in items if item.find(WSA_ENDPOINT_REFERENCE) is not None]
 
         if len(jobs) > 1:
             # XXX Make a different exception
@@ -283,7 +404,7 @@ class InvokeResponse(WSMANClassResponse):
         if jobs:
             job = jobs.pop()
 
-            jids = job.xpath(jid_path, namespaces=self._nsmap)
+            jids = _JID_XP(job)
 
             if len(jids) != 1:
                 # XXX Make a different exception
@@ -171,6 +171,9 @@ setuptools.setup(
         'click>=6.6',
         'jsonschema>=2.5.1',
     ],
+    extras_require={
+        'orjson': ['orjson>=3.0.0; python_version >= "3.6"'],
+    },
     keywords=['development'],
     license='Apache 2.0',
     # TODO - Need to write up a long description for visibility in PyPI when open sourced
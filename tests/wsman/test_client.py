@@ -32,7 +32,9 @@ import responses
 import testfixtures
 
 # this project
-from dractor.wsman._client import WSMANClient, HTTPConfig, WSMANBasicAuthConfig
+from dractor.exceptions import WSMANHTTPError
+from dractor.wsman._client import CustomHTTPAdapter, WSMANClient, HTTPConfig, WSMANBasicAuthConfig
+from dractor.wsman._envelopes import GetEnvelope, MESSAGE_ID_PLACEHOLDER
 
 #
 # Tests
@@ -74,3 +76,199 @@ def test_do_post(init_kwargs):
     payload = "fake"
     reply = client._do_post(payload)
     assert reply == fake_response_text
+
+
+@responses.activate
+def test_do_post_reuses_session():
+    """Make sure consecutive posts share one HTTP session"""
+
+    responses.add(
+        responses.POST,
+        "https://localhost:443/wsman",
+        body=b"fake response from wsman",
+        status=200,
+        content_type='application/xml')
+
+    with WSMANClient("localhost") as client:
+        session = client._session
+        with mock.patch.object(session, 'post', wraps=session.post) as post:
+            client._do_post("one")
+            client._do_post("two")
+        assert post.call_count == 2
+        assert client._session is session
+
+
+@responses.activate
+def test_do_post_sends_basic_auth():
+    """The pre-encoded Authorization header matches what requests would build"""
+
+    responses.add(
+        responses.POST,
+        "https://localhost:443/wsman",
+        body=b"fake response from wsman",
+        status=200,
+        content_type='application/xml')
+
+    client = WSMANClient("localhost", auth_config=WSMANBasicAuthConfig(password="foo"))
+    client._do_post("one")
+    client._do_post("two")
+
+    for call in responses.calls:
+        assert call.request.headers['Authorization'] == "Basic cm9vdDpmb28="
+
+
+@responses.activate
+def test_do_post_retries_busy_drac():
+    """A busy DRAC (503) is retried, a SOAP fault (500) is not"""
+
+    url = "https://localhost:443/wsman"
+    responses.add(responses.POST, url, status=503)
+    responses.add(responses.POST, url, body=b"fake response from wsman", status=200)
+    responses.add(responses.POST, url, status=500)
+
+    client = WSMANClient("localhost")
+    with mock.patch.object(client._http_adapter.max_retries, 'backoff_factor', 0):
+        assert client._do_post("one") == b"fake response from wsman"
+        assert len(responses.calls) == 2
+
+        with pytest.raises(WSMANHTTPError):
+            client._do_post("two")
+        assert len(responses.calls) == 3
+
+
+def test_retry_policy_on_old_urllib3():
+    """The retry policy builds with the Retry signature bundled in requests 2.11"""
+
+    # pylint: disable=unused-argument
+    def old_retry(total=10, connect=None, read=None, redirect=None, method_whitelist=None,
+                  status_forcelist=None, backoff_factor=0, raise_on_redirect=True,
+                  raise_on_status=True, _observed_errors=0):
+        return method_whitelist
+
+    with mock.patch('dractor.wsman._client.Retry', side_effect=old_retry):
+        assert CustomHTTPAdapter._retry_policy(3) == frozenset(['POST'])
+
+
+@responses.activate
+def test_do_post_ignores_environment(monkeypatch):
+    """Proxy and CA bundle environment variables don't override HTTPConfig"""
+
+    monkeypatch.setenv('REQUESTS_CA_BUNDLE', '/etc/ssl/certs/ca-certificates.crt')
+    monkeypatch.setenv('HTTPS_PROXY', 'http://proxy.example.com:3128')
+    responses.add(
+        responses.POST,
+        "https://localhost:443/wsman",
+        body=b"fake response from wsman",
+        status=200,
+        content_type='application/xml')
+
+    client = WSMANClient("localhost")
+    with mock.patch.object(client._http_adapter, 'send', wraps=client._http_adapter.send) as send:
+        client._do_post("one")
+
+    _, kwargs = send.call_args
+    assert kwargs['verify'] is False
+    assert not kwargs['proxies']
+
+
+def test_context_manager_closes_session():
+    """Exiting the client context closes the HTTP session"""
+
+    client = WSMANClient("localhost")
+    with mock.patch.object(client._session, 'close') as close:
+        with client:
+            pass
+    close.assert_called_once_with()
+
+
+def test_enumerate_many():
+    """enumerate_many() returns each class's items keyed by class name"""
+
+    client = WSMANClient("localhost")
+    classes = ['DCIM_NICView', 'DCIM_CPUView', 'DCIM_SystemView']
+
+    with mock.patch.object(client, 'enumerate', side_effect=lambda name: [{'Class': name}]):
+        results = client.enumerate_many(classes)
+
+    assert results == {name: [{'Class': name}] for name in classes}
+    assert client.enumerate_many([]) == {}
+
+
+def test_enumerate_records_invoke_selectors():
+    """Enumerating a class caches its invoke selectors for later clients too"""
+
+    shared = {}
+    item = {'CreationClassName': 'DCIM_BIOSService', 'SystemCreationClassName': 'DCIM_ComputerSystem',
+            'SystemName': 'DCIM:ComputerSystem', 'Name': 'DCIM:BIOSService', 'Status': 'OK'}
+
+    client = WSMANClient("localhost", invoke_selectors=shared)
+    with mock.patch.object(client, '_get_context'), \
+         mock.patch.object(client, '_pull_context', return_value=[item]):
+        client.enumerate('DCIM_BIOSService')
+
+    expected = {'__cimnamespace': 'root/dcim', 'CreationClassName': 'DCIM_BIOSService',
+                'SystemCreationClassName': 'DCIM_ComputerSystem',
+                'SystemName': 'DCIM:ComputerSystem', 'Name': 'DCIM:BIOSService'}
+    assert shared == {'DCIM_BIOSService': expected}
+
+    other = WSMANClient("localhost", invoke_selectors=shared)
+    with mock.patch.object(other, 'enumerate') as enumerate_mock:
+        assert other._get_invoke_selectors('DCIM_BIOSService') == expected
+    assert not enumerate_mock.called
+
+
+def test_discover_invoke_selector_stores_once():
+    """Discovery reuses the selectors enumerate() just recorded"""
+
+    client = WSMANClient("localhost")
+    item = {'Name': 'DCIM:BIOSService', 'Status': 'OK'}
+
+    with mock.patch.object(client, '_get_context'), \
+         mock.patch.object(client, '_pull_context', return_value=[item]), \
+         mock.patch.object(client, '_store_invoke_selectors',
+                           wraps=client._store_invoke_selectors) as store:
+        selectors = client._get_invoke_selectors('DCIM_BIOSService')
+
+    assert store.call_count == 1
+    assert selectors == {'__cimnamespace': 'root/dcim', 'Name': 'DCIM:BIOSService'}
+
+
+GET_RESPONSE = b"""<?xml version="1.0" encoding="UTF-8"?>
+<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"
+ xmlns:n1="http://schemas.dell.com/wbem/wscim/1/cim-schema/2/DCIM_NICView">
+<s:Header/>
+<s:Body><n1:DCIM_NICView><n1:FQDD>NIC.Integrated.1-1-1</n1:FQDD></n1:DCIM_NICView></s:Body>
+</s:Envelope>"""
+
+
+def test_get_caches_envelope():
+    """Repeated gets reuse the serialized envelope with a new MessageID"""
+
+    client = WSMANClient("localhost")
+    selectors = {'InstanceID': 'NIC.Integrated.1-1-1'}
+
+    with mock.patch.object(client, '_do_post', return_value=GET_RESPONSE) as do_post, \
+            mock.patch('dractor.wsman._client.GetEnvelope', wraps=GetEnvelope) as envelope:
+        assert client.get('DCIM_NICView', selectors) == {'FQDD': 'NIC.Integrated.1-1-1'}
+        assert client.get('DCIM_NICView', selectors) == {'FQDD': 'NIC.Integrated.1-1-1'}
+
+    assert envelope.call_count == 1
+    first, second = [call[0][0] for call in do_post.call_args_list]
+    assert first != second
+    assert MESSAGE_ID_PLACEHOLDER not in first
+    assert first.replace(first[first.index(b'uuid:'):first.index(b'</wsa:MessageID>')], b'') == \
+        second.replace(second[second.index(b'uuid:'):second.index(b'</wsa:MessageID>')], b'')
+
+
+def test_envelope_cache_is_bounded():
+    """The envelope cache keeps only the most recently used documents"""
+
+    client = WSMANClient("localhost")
+    client.ENVELOPE_CACHE_SIZE = 2
+
+    for job_id in ('JID_1', 'JID_2', 'JID_1', 'JID_3'):
+        client._cached_document(('get', 'DCIM_LifecycleJob', job_id),
+                                lambda job_id=job_id: GetEnvelope(client._url, 'DCIM_LifecycleJob',
+                                                                  {'InstanceID': job_id}))
+
+    assert [key[2] for key in client._envelope_cache] == ['JID_1', 'JID_3']
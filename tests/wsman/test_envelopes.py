@@ -0,0 +1,184 @@
+# Copyright (C) 2026 Verizon. All Rights Reserved.
+#
+#     File:    test_envelopes.py
+#     Author:  agent
+#     Date:    2026-10-15
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+#
+# Imports
+#
+
+# core python
+import uuid
+
+# third party
+import pytest
+from lxml import etree
+
+# this project
+from dractor.exceptions import WSMANSOAPEnvelopeError
+from dractor.types import CIM_SoftwareIdentity
+from dractor.wsman._envelopes import (
+    EnumerateEnvelope,
+    GetEnvelope,
+    IdentifyEnvelope,
+    InvokeEnvelope,
+    PullEnvelope,
+    new_message_id,
+)
+from dractor.wsman._namespace import NS
+
+#
+# Helpers
+#
+
+TO_URL = "https://localhost:443/wsman"
+
+
+def _parse(document):
+    """Parse an envelope document back into an element tree"""
+    if isinstance(document, str):
+        document = document.encode('utf-8')
+    return etree.fromstring(document)
+
+
+def _xpath(root, path, nsmap=None):
+    """Run an xpath query against an envelope"""
+    namespaces = dict(NS)
+    namespaces.update(nsmap or {})
+    return root.xpath(path, namespaces=namespaces)
+
+#
+# Tests
+#
+
+
+def test_identify_document():
+    """The identify envelope contains the Identify request"""
+    root = _parse(IdentifyEnvelope().document)
+    assert _xpath(root, "/s:Envelope/s:Body/wsmid:Identify")
+
+
+def test_get_envelope():
+    """Get envelopes carry the header fields and escaped selectors"""
+    envelope = GetEnvelope(TO_URL, 'DCIM_NICView', {'InstanceID': 'NIC<1>&"2"'})
+    root = _parse(envelope.document)
+
+    assert _xpath(root, "string(/s:Envelope/s:Header/wsa:To)") == TO_URL
+    assert _xpath(root, "string(/s:Envelope/s:Header/wsa:Action)") == \
+        "{}/Get".format(NS['wstransfer'])
+    assert _xpath(root, "string(/s:Envelope/s:Header/wsman:ResourceURI)") == \
+        "{}/DCIM_NICView".format(NS['dcim'])
+    assert _xpath(root, "string(/s:Envelope/s:Header/wsa:MessageID)").startswith("uuid:")
+
+    selectors = _xpath(root, "/s:Envelope/s:Header/wsman:SelectorSet/wsman:Selector")
+    assert len(selectors) == 1
+    assert selectors[0].get("{{{}}}Name".format(NS['wsman'])) == 'InstanceID'
+    assert selectors[0].text == 'NIC<1>&"2"'
+
+
+def test_selector_values_round_trip():
+    """None gives an empty selector and carriage returns survive serialization"""
+    envelope = InvokeEnvelope(TO_URL, 'DCIM_RAIDService', 'ResetConfig',
+                              {'Name': None, 'SystemName': 'line\r\nbreak'}, [('Target', 'a\rb')])
+    root = _parse(envelope.document)
+
+    selectors = _xpath(root, "/s:Envelope/s:Header/wsman:SelectorSet/wsman:Selector")
+    assert [(x.get("{{{}}}Name".format(NS['wsman'])), x.text) for x in selectors] == \
+        [('Name', None), ('SystemName', 'line\r\nbreak')]
+
+    nsmap = {'dcim_class': "{}/DCIM_RAIDService".format(NS['dcim'])}
+    assert _xpath(root, "string(/s:Envelope/s:Body/dcim_class:ResetConfig_INPUT/dcim_class:Target)",
+                  nsmap) == 'a\rb'
+
+
+def test_message_id_is_uuid4():
+    """MessageIDs are valid random (version 4) UUIDs"""
+    for _ in range(32):
+        message_id = new_message_id()
+        assert message_id.startswith("uuid:")
+        parsed = uuid.UUID(message_id[len("uuid:"):])
+        assert parsed.version == 4
+        assert parsed.variant == uuid.RFC_4122
+        assert str(parsed) == message_id[len("uuid:"):]
+
+
+def test_message_id_changes():
+    """Every document gets a fresh MessageID"""
+    envelope = EnumerateEnvelope(TO_URL, 'DCIM_NICView')
+    first = _xpath(_parse(envelope.document), "string(/s:Envelope/s:Header/wsa:MessageID)")
+    second = _xpath(_parse(envelope.document), "string(/s:Envelope/s:Header/wsa:MessageID)")
+    assert first != second
+
+
+def test_enumerate_envelope():
+    """Enumerate envelopes have an Enumerate body"""
+    root = _parse(EnumerateEnvelope(TO_URL, 'DCIM_NICView').document)
+    assert _xpath(root, "/s:Envelope/s:Body/wsen:Enumerate")
+
+
+@pytest.mark.parametrize("max_elements", [1, 50])
+def test_pull_envelope(max_elements):
+    """Pull envelopes carry the context and optional MaxElements"""
+    envelope = PullEnvelope(TO_URL, 'DCIM_NICView', 'context-1', max_elements=max_elements)
+    root = _parse(envelope.document)
+
+    assert _xpath(root, "string(/s:Envelope/s:Body/wsen:Pull/wsen:EnumerationContext)") == 'context-1'
+    max_xml = _xpath(root, "/s:Envelope/s:Body/wsen:Pull/wsman:MaxElements")
+    if max_elements > 1:
+        assert max_xml[0].text == str(max_elements)
+        assert _xpath(root, "/s:Envelope/s:Body/wsen:Pull/wsman:OptimizeEnumeration")
+    else:
+        assert not max_xml
+
+
+def test_pull_envelope_without_context():
+    """A missing context gives an empty EnumerationContext rather than an error"""
+    root = _parse(PullEnvelope(TO_URL, 'DCIM_NICView', None).document)
+    context = _xpath(root, "/s:Envelope/s:Body/wsen:Pull/wsen:EnumerationContext")
+    assert len(context) == 1
+    assert context[0].text is None
+
+
+def test_invoke_envelope():
+    """Invoke envelopes carry the input properties, including references"""
+    resource_uri = "{}/DCIM_SoftwareInstallationService".format(NS['dcim'])
+    properties = [
+        ('Target', 'a&b'),
+        ('PDArray', 'one'),
+        ('PDArray', 'two'),
+        ('Source', CIM_SoftwareIdentity('DCIM:INSTALLED#1')),
+    ]
+    envelope = InvokeEnvelope(TO_URL, 'DCIM_SoftwareInstallationService', 'InstallFromURI',
+                              {'Name': 'SoftwareUpdate'}, properties)
+    root = _parse(envelope.document)
+    nsmap = {'dcim_class': resource_uri}
+
+    assert _xpath(root, "string(/s:Envelope/s:Header/wsa:Action)") == \
+        "{}/InstallFromURI".format(resource_uri)
+
+    inputs = _xpath(root, "/s:Envelope/s:Body/dcim_class:InstallFromURI_INPUT/dcim_class:*", nsmap)
+    assert [etree.QName(x).localname for x in inputs] == ['Target', 'PDArray', 'PDArray', 'Source']
+    assert [x.text for x in inputs[:3]] == ['a&b', 'one', 'two']
+
+    selector = _xpath(inputs[3], "wsa:ReferenceParameters/wsman:SelectorSet/wsman:Selector")
+    assert selector[0].get("Name") == "InstanceID"
+    assert selector[0].text == "DCIM:INSTALLED#1"
+
+
+def test_invoke_envelope_bad_property():
+    """Unknown property value types are rejected"""
+    with pytest.raises(WSMANSOAPEnvelopeError):
+        InvokeEnvelope(TO_URL, 'DCIM_RAIDService', 'ResetConfig', {}, [('Target', 42)])
@@ -0,0 +1,174 @@
+# Copyright (C) 2026 Verizon. All Rights Reserved.
+#
+#     File:    test_parsers.py
+#     Author:  agent
+#     Date:    2026-10-15
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+#
+# Imports
+#
+
+# third party
+import pytest
+
+# this project
+from dractor.exceptions import WSMANElementNotFound, WSMANFault, WSMANSOAPResponseError
+from dractor.wsman._parsers import (
+    EnumerateResponse,
+    GetResponse,
+    IdentifyResponse,
+    InvokeResponse,
+    PullResponse,
+)
+
+#
+# Helpers
+#
+
+ENVELOPE = """<?xml version="1.0" encoding="UTF-8"?>
+<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"
+            xmlns:wsa="http://schemas.xmlsoap.org/ws/2004/08/addressing"
+            xmlns:wsman="http://schemas.dmtf.org/wbem/wsman/1/wsman.xsd"
+            xmlns:wsen="http://schemas.xmlsoap.org/ws/2004/09/enumeration"
+            xmlns:wsmid="http://schemas.dmtf.org/wbem/wsman/identity/1/wsmanidentity.xsd"
+            xmlns:dell="http://schemas.dell.com/wbem/wscim/1/cim-schema/2/wsmanidentity.xsd"
+            xmlns:n1="http://schemas.dell.com/wbem/wscim/1/cim-schema/2/{dcim_class}">
+  <s:Header>
+    <wsa:Action>response</wsa:Action>
+  </s:Header>
+  <s:Body>{body}</s:Body>
+</s:Envelope>"""
+
+
+def _document(body, dcim_class='DCIM_NICView'):
+    """Wrap body in a SOAP envelope as the DRAC would send it"""
+    return ENVELOPE.format(body=body, dcim_class=dcim_class).encode('utf-8')
+
+
+def _nic(fqdd):
+    """A DCIM_NICView instance"""
+    return "<n1:DCIM_NICView><n1:FQDD>{}</n1:FQDD><n1:LinkSpeed/></n1:DCIM_NICView>".format(fqdd)
+
+#
+# Tests
+#
+
+
+def test_identify():
+    """Identify returns Dell's vendor fields"""
+    document = _document("<wsmid:IdentifyResponse>"
+                         "<dell:ProductVendor>Dell Inc.</dell:ProductVendor>"
+                         "<dell:LifecycleControllerVersion>2.30.30.30</dell:LifecycleControllerVersion>"
+                         "</wsmid:IdentifyResponse>")
+    response = IdentifyResponse(document)
+    assert response['LifecycleControllerVersion'] == '2.30.30.30'
+    assert response.get('LifecycleControllerVersion') == '2.30.30.30'
+    assert response.get('Missing', 'default') == 'default'
+    assert response['ProductVendor'] == 'Dell Inc.'
+
+
+def test_get_collects_arrays():
+    """Repeated properties of a Get become lists"""
+    document = _document("<n1:DCIM_NICView><n1:FQDD>NIC.1</n1:FQDD>"
+                         "<n1:Addr>a</n1:Addr><n1:Addr>b</n1:Addr></n1:DCIM_NICView>")
+    response = GetResponse(document, 'DCIM_NICView')
+    assert response.dictionary == {'FQDD': 'NIC.1', 'Addr': ['a', 'b']}
+
+
+def test_get_from_str():
+    """Text documents, XML declaration included, parse like bytes"""
+    document = _document("<n1:DCIM_NICView><!-- comment --><n1:FQDD>NIC.1</n1:FQDD></n1:DCIM_NICView>")
+    response = GetResponse(document.decode('utf-8'), 'DCIM_NICView')
+    assert response.dictionary == {'FQDD': 'NIC.1'}
+
+
+def test_enumerate_context():
+    """Enumerate responses only carry a context"""
+    document = _document("<wsen:EnumerateResponse><wsen:EnumerationContext>ctx-1"
+                         "</wsen:EnumerationContext></wsen:EnumerateResponse>")
+    assert EnumerateResponse(document).context == 'ctx-1'
+
+    with pytest.raises(WSMANElementNotFound):
+        EnumerateResponse(_document(""))
+
+
+@pytest.mark.parametrize("end_of_sequence", [True, False])
+def test_pull(end_of_sequence):
+    """Pull returns one dictionary per instance"""
+    document = _document("<wsen:PullResponse><wsen:Items>{}{}</wsen:Items>{}</wsen:PullResponse>".format(
+        _nic('NIC.1'), _nic('NIC.2'), "<wsen:EndOfSequence/>" if end_of_sequence else ""))
+    response = PullResponse(document, 'DCIM_NICView')
+    assert response.end_of_sequence is end_of_sequence
+    assert response.items == [{'FQDD': 'NIC.1', 'LinkSpeed': None},
+                              {'FQDD': 'NIC.2', 'LinkSpeed': None}]
+
+
+def test_invoke_job():
+    """A job reference in an Invoke output collapses to its job ID"""
+    document = _document("""<n1:CreateTargetedConfigJob_OUTPUT>
+      <n1:Job>
+        <wsa:EndpointReference>
+          <wsa:Address>http://schemas.xmlsoap.org/ws/2004/08/addressing/role/anonymous</wsa:Address>
+          <wsa:ReferenceParameters>
+            <wsman:ResourceURI>http://schemas.dell.com/wbem/wscim/1/cim-schema/2/DCIM_LifecycleJob</wsman:ResourceURI>
+            <wsman:SelectorSet>
+              <wsman:Selector Name="InstanceID">JID_757491269724</wsman:Selector>
+              <wsman:Selector Name="__cimnamespace">root/dcim</wsman:Selector>
+            </wsman:SelectorSet>
+          </wsa:ReferenceParameters>
+        </wsa:EndpointReference>
+      </n1:Job>
+      <n1:ReturnValue>4096</n1:ReturnValue>
+    </n1:CreateTargetedConfigJob_OUTPUT>""", dcim_class='DCIM_RAIDService')
+    response = InvokeResponse(document, 'DCIM_RAIDService', 'CreateTargetedConfigJob')
+    assert response.dictionary == {'Job': 'JID_757491269724', 'ReturnValue': '4096'}
+
+
+def test_invoke_missing_output():
+    """An Invoke response without the method's output is an error"""
+    document = _document("<n1:Other_OUTPUT><n1:ReturnValue>0</n1:ReturnValue></n1:Other_OUTPUT>",
+                         dcim_class='DCIM_RAIDService')
+    with pytest.raises(WSMANElementNotFound):
+        InvokeResponse(document, 'DCIM_RAIDService', 'CreateTargetedConfigJob')
+
+
+def test_fault():
+    """SOAP faults raise WSMANFault with the code and reason"""
+    document = _document("<s:Fault><s:Code><s:Value>s:Sender</s:Value>"
+                         "<s:Subcode><s:Value>wsman:InvalidSelectors</s:Value></s:Subcode></s:Code>"
+                         "<s:Reason><s:Text>Bad selector</s:Text></s:Reason></s:Fault>")
+    with pytest.raises(WSMANFault) as excinfo:
+        GetResponse(document, 'DCIM_NICView')
+    assert "wsman:InvalidSelectors" in str(excinfo.value)
+    assert "Bad selector" in str(excinfo.value)
+
+
+def test_pull_columns():
+    """Pull can also return one list per property"""
+    document = _document("<wsen:PullResponse><wsen:Items>{}{}"
+                         "<n1:DCIM_NICView><n1:FQDD>NIC.3</n1:FQDD><n1:Extra>x</n1:Extra></n1:DCIM_NICView>"
+                         "</wsen:Items></wsen:PullResponse>".format(_nic('NIC.1'), _nic('NIC.2')))
+    response = PullResponse(document, 'DCIM_NICView')
+    assert response.columns == {'FQDD': ['NIC.1', 'NIC.2', 'NIC.3'],
+                                'LinkSpeed': [None, None, None],
+                                'Extra': [None, None, 'x']}
+    assert response.items[2] == {'FQDD': 'NIC.3', 'Extra': 'x'}
+
+
+@pytest.mark.parametrize("document", [b"", b"   ", b"not xml"])
+def test_unparseable(document):
+    """Garbage replies raise a response error rather than AttributeError"""
+    with pytest.raises(WSMANSOAPResponseError):
+        GetResponse(document, 'DCIM_NICView')